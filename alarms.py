@@ -0,0 +1,305 @@
+# This Python file uses the following encoding: utf-8
+from bisect import bisect_left, bisect_right
+import time
+
+class Event:
+    __slots__ = ("timestamp", "board", "rule", "state", "value")
+
+    def __init__(self, timestamp, board, rule, state, value):
+        self.timestamp = timestamp
+        self.board = board
+        self.rule = rule
+        self.state = state
+        self.value = value
+
+    def __repr__(self):
+        return "Event({0:.3f}, {1}, {2}, {3}, {4!r})".format(
+            self.timestamp, self.board, self.rule, self.state, self.value)
+
+class EventLog:
+    # Events are kept sorted by timestamp, globally and per board, so that
+    # time range queries are two bisections instead of a scan
+    def __init__(self, max_events = 100000):
+        self.max_events = max_events
+        self.events = []
+        self.times = []
+        self.board_events = {}
+        self.board_times = {}
+
+    def append(self, event):
+        if len(self.events) >= self.max_events:
+            self.trim(len(self.events) - self.max_events + 1)
+
+        if not self.times or event.timestamp >= self.times[-1]:
+            self.times.append(event.timestamp)
+            self.events.append(event)
+        else:
+            index = bisect_right(self.times, event.timestamp)
+            self.times.insert(index, event.timestamp)
+            self.events.insert(index, event)
+
+        times = self.board_times.setdefault(event.board, [])
+        events = self.board_events.setdefault(event.board, [])
+        if not times or event.timestamp >= times[-1]:
+            times.append(event.timestamp)
+            events.append(event)
+        else:
+            index = bisect_right(times, event.timestamp)
+            times.insert(index, event.timestamp)
+            events.insert(index, event)
+
+    def trim(self, count):
+        dropped = self.events[:count]
+        del self.events[:count]
+        del self.times[:count]
+        for event in dropped:
+            events = self.board_events[event.board]
+            del events[0]
+            del self.board_times[event.board][0]
+            if not events:
+                del self.board_events[event.board]
+                del self.board_times[event.board]
+
+    def query(self, board = None, start = None, end = None, rule = None):
+        if board is None:
+            times, events = self.times, self.events
+        else:
+            times = self.board_times.get(board, [])
+            events = self.board_events.get(board, [])
+        lo = 0 if start is None else bisect_left(times, start)
+        hi = len(times) if end is None else bisect_right(times, end)
+        if rule is None:
+            return events[lo:hi]
+        return [event for event in events[lo:hi] if event.rule == rule]
+
+    def boards(self):
+        return list(self.board_events.keys())
+
+    def __len__(self):
+        return len(self.events)
+
+class Rule:
+    # A rule raises after on_count consecutive samples matching active() and
+    # clears after off_count consecutive samples matching inactive(). Keeping
+    # the two conditions apart is what gives threshold rules their hysteresis.
+    def __init__(self, name, key, condition = None, on_count = 1, off_count = 1):
+        if condition is None and type(self).active is Rule.active:
+            raise ValueError("Rule " + name + " needs a condition")
+        self.name = name
+        self.key = key
+        self.condition = condition
+        self.on_count = on_count
+        self.off_count = off_count
+
+    def active(self, value, state):
+        return self.condition(value)
+
+    def inactive(self, value, state):
+        return not self.active(value, state)
+
+class ThresholdRule(Rule):
+    def __init__(self, name, key, high = None, low = None, hysteresis = 0,
+                 absolute = False, on_count = 1, off_count = 1):
+        super().__init__(name, key, on_count = on_count, off_count = off_count)
+        self.high = high
+        self.low = low
+        self.hysteresis = hysteresis
+        self.absolute = absolute
+
+    def active(self, value, state):
+        if self.absolute:
+            value = abs(value)
+        if self.high is not None and value > self.high:
+            return True
+        if self.low is not None and value < self.low:
+            return True
+        return False
+
+    def inactive(self, value, state):
+        if self.absolute:
+            value = abs(value)
+        if self.high is not None:
+            clear = self.high - self.hysteresis
+            # A magnitude never drops below zero, so neither may its clear bound
+            if self.absolute:
+                clear = max(clear, 0)
+            if value > clear:
+                return False
+        if self.low is not None and value < self.low + self.hysteresis:
+            return False
+        return True
+
+class ChangeRule(Rule):
+    # Raises when the value differs from the previous sample, unless the
+    # change was announced beforehand with AlarmEngine.expect() or
+    # AlarmEngine.suppress(). Announcements only cover the next sample.
+    def __init__(self, name, key, on_count = 1, off_count = 1):
+        super().__init__(name, key, on_count = on_count, off_count = off_count)
+
+    def active(self, value, state):
+        if state.suppressed:
+            return False
+        if state.expected is not None and value == state.expected:
+            return False
+        return state.previous is not None and value != state.previous
+
+class FleetRule(Rule):
+    # Evaluated over the latest value of key from every board; condition
+    # receives a dict of board -> value and returns the offending value
+    # (or None when everything is fine)
+    def __init__(self, name, key, condition, on_count = 1, off_count = 1):
+        super().__init__(name, key, condition, on_count, off_count)
+
+    def active(self, value, state):
+        return value is not None
+
+def spread_above(limit):
+    def condition(values):
+        if len(values) < 2:
+            return None
+        spread = max(values.values()) - min(values.values())
+        return spread if spread > limit else None
+    return condition
+
+class RuleState:
+    __slots__ = ("raised", "count", "previous", "expected", "suppressed")
+
+    def __init__(self):
+        self.raised = False
+        self.count = 0
+        self.previous = None
+        self.expected = None
+        self.suppressed = False
+
+class AlarmEngine:
+    # Fleet events are logged under this board name
+    FLEET = "fleet"
+
+    def __init__(self, log = None):
+        self.log = EventLog() if log is None else log
+        self.rules = []
+        self.fleet_rules = []
+        self.states = {}
+        self.fleet_states = {}
+        self.latest = {}
+        self.listeners = []
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+        return rule
+
+    def add_fleet_rule(self, rule):
+        self.fleet_rules.append(rule)
+        return rule
+
+    def connect(self, listener):
+        self.listeners.append(listener)
+
+    def expect(self, board, key, value):
+        for rule in self.rules:
+            if rule.key == key:
+                self.state(board, rule).expected = value
+
+    def suppress(self, board):
+        # For writes whose effect on the monitored values is not known in
+        # advance (resets, raw register writes)
+        for rule in self.rules:
+            if isinstance(rule, ChangeRule):
+                self.state(board, rule).suppressed = True
+
+    def state(self, board, rule):
+        states = self.states.get(board)
+        if states is None:
+            states = self.states[board] = {}
+        state = states.get(rule.name)
+        if state is None:
+            state = states[rule.name] = RuleState()
+        return state
+
+    def active(self, board = None):
+        result = []
+        for name, states in self.states.items():
+            if board is not None and name != board:
+                continue
+            for rule, state in states.items():
+                if state.raised:
+                    result.append((name, rule))
+        return result
+
+    def fleet_active(self):
+        return [rule for rule, state in self.fleet_states.items() if state.raised]
+
+    def remove_board(self, board, timestamp = None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.latest.pop(board, None)
+        states = self.states.pop(board, {})
+        for rule, state in states.items():
+            if state.raised:
+                self.emit(Event(timestamp, board, rule, "removed", state.previous))
+
+    def evaluate(self, board, sample, timestamp = None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.latest[board] = sample
+        events = []
+        for rule in self.rules:
+            value = sample.get(rule.key)
+            if value is None:
+                continue
+            state = self.state(board, rule)
+            if state.raised:
+                hit = rule.inactive(value, state)
+            else:
+                hit = rule.active(value, state)
+            event = self.step(board, rule, state, hit, value, timestamp)
+            if event is not None:
+                events.append(event)
+            state.previous = value
+            state.expected = None
+            state.suppressed = False
+        return events
+
+    def evaluate_fleet(self, timestamp = None):
+        # Called once per polling round rather than once per sample so the
+        # cost stays linear in the number of boards
+        if timestamp is None:
+            timestamp = time.time()
+        events = []
+        for rule in self.fleet_rules:
+            values = {}
+            for board, sample in self.latest.items():
+                value = sample.get(rule.key)
+                if value is not None:
+                    values[board] = value
+            value = rule.condition(values)
+            state = self.fleet_states.get(rule.name)
+            if state is None:
+                state = self.fleet_states[rule.name] = RuleState()
+            if state.raised:
+                hit = rule.inactive(value, state)
+            else:
+                hit = rule.active(value, state)
+            event = self.step(self.FLEET, rule, state, hit, value, timestamp)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def step(self, board, rule, state, hit, value, timestamp):
+        if not hit:
+            state.count = 0
+            return None
+        state.count += 1
+        if state.count < (rule.off_count if state.raised else rule.on_count):
+            return None
+        state.raised = not state.raised
+        state.count = 0
+        event = Event(timestamp, board, rule.name,
+                      "raised" if state.raised else "cleared", value)
+        self.emit(event)
+        return event
+
+    def emit(self, event):
+        self.log.append(event)
+        for listener in self.listeners:
+            listener(event)
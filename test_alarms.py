@@ -0,0 +1,152 @@
+# This Python file uses the following encoding: utf-8
+import pytest
+from alarms import AlarmEngine, ChangeRule, Event, EventLog, FleetRule, Rule, ThresholdRule, spread_above
+
+def run(engine, board, key, values):
+    states = []
+    for t, value in enumerate(values):
+        for event in engine.evaluate(board, {key: value}, t):
+            states.append((t, event.state))
+    return states
+
+def test_threshold_debounce_counts():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("dev", "d", high = 10, absolute = True,
+                                  on_count = 2, off_count = 3))
+    assert run(engine, "a", "d", [12, 0, -12, 12, 0, 0, 12, 0, 0, 0]) == \
+        [(3, "raised"), (9, "cleared")]
+
+def test_threshold_hysteresis_boundary():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("dev", "d", high = 10, hysteresis = 3, absolute = True))
+    assert run(engine, "a", "d", [11, 8, -8, 7]) == [(0, "raised"), (3, "cleared")]
+
+def test_threshold_hysteresis_wider_than_limit_still_clears():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("dev", "d", high = 3, hysteresis = 5, absolute = True))
+    assert run(engine, "a", "d", [10, 0, 0, 0]) == [(0, "raised"), (1, "cleared")]
+
+def test_threshold_low():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("low", "v", low = 5, hysteresis = 2))
+    assert run(engine, "a", "v", [4, 6, 7]) == [(0, "raised"), (2, "cleared")]
+
+def test_rule_with_condition():
+    engine = AlarmEngine()
+    engine.add_rule(Rule("errors", "link_errors", condition = lambda value: value > 0))
+    assert run(engine, "a", "link_errors", [0, 2, 0]) == [(1, "raised"), (2, "cleared")]
+
+def test_rule_without_condition_is_rejected():
+    with pytest.raises(ValueError):
+        Rule("errors", "link_errors")
+
+def test_change_rule():
+    engine = AlarmEngine()
+    engine.add_rule(ChangeRule("vco", "v"))
+    assert run(engine, "a", "v", [1, 1, 2, 2]) == [(2, "raised"), (3, "cleared")]
+
+def test_expect_suppresses_announced_change():
+    engine = AlarmEngine()
+    engine.add_rule(ChangeRule("vco", "v"))
+    engine.evaluate("a", {"v": 1}, 0)
+    engine.expect("a", "v", 2)
+    assert engine.evaluate("a", {"v": 2}, 1) == []
+    assert engine.active() == []
+
+def test_expect_expires_after_next_sample():
+    engine = AlarmEngine()
+    engine.add_rule(ChangeRule("vco", "v"))
+    engine.evaluate("a", {"v": 1}, 0)
+    engine.expect("a", "v", 2)
+    # The write did not take effect
+    assert engine.evaluate("a", {"v": 1}, 1) == []
+    events = engine.evaluate("a", {"v": 2}, 2)
+    assert [event.state for event in events] == ["raised"]
+
+def test_suppress_skips_change_rules_for_one_sample():
+    engine = AlarmEngine()
+    engine.add_rule(ChangeRule("vco", "v"))
+    engine.add_rule(ThresholdRule("temp", "t", high = 14))
+    engine.evaluate("a", {"v": 1, "t": 10}, 0)
+    engine.suppress("a")
+    events = engine.evaluate("a", {"v": 2, "t": 15}, 1)
+    assert [(event.rule, event.state) for event in events] == [("temp", "raised")]
+    events = engine.evaluate("a", {"v": 3, "t": 15}, 2)
+    assert [(event.rule, event.state) for event in events] == [("vco", "raised")]
+
+def test_boards_are_independent():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("temp", "t", high = 14))
+    engine.evaluate("a", {"t": 15}, 0)
+    engine.evaluate("b", {"t": 10}, 0)
+    assert engine.active() == [("a", "temp")]
+    assert engine.active("b") == []
+    engine.remove_board("a", 1)
+    assert engine.active() == []
+
+def test_remove_board_logs_raised_alarms():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("temp", "t", high = 14))
+    engine.add_rule(ThresholdRule("dev", "d", high = 10))
+    seen = []
+    engine.connect(seen.append)
+    engine.evaluate("a", {"t": 15, "d": 0}, 0)
+    engine.remove_board("a", 1)
+    assert [(event.rule, event.state) for event in seen] == [("temp", "raised"), ("temp", "removed")]
+    assert [event.state for event in engine.log.query(board = "a", start = 1)] == ["removed"]
+
+def test_fleet_spread_raises_and_clears():
+    engine = AlarmEngine()
+    engine.add_fleet_rule(FleetRule("spread", "d", spread_above(20)))
+    engine.evaluate("a", {"d": 0}, 0)
+    assert engine.evaluate_fleet(0) == []
+    engine.evaluate("b", {"d": 30}, 1)
+    events = engine.evaluate_fleet(1)
+    assert [(event.board, event.state, event.value) for event in events] == \
+        [(engine.FLEET, "raised", 30)]
+    assert engine.fleet_active() == ["spread"]
+    assert engine.active() == []
+    engine.evaluate("b", {"d": 10}, 2)
+    events = engine.evaluate_fleet(2)
+    assert [event.state for event in events] == ["cleared"]
+    assert engine.fleet_active() == []
+
+def test_fleet_ignores_removed_boards():
+    engine = AlarmEngine()
+    engine.add_fleet_rule(FleetRule("spread", "d", spread_above(20)))
+    engine.evaluate("a", {"d": 0}, 0)
+    engine.evaluate("b", {"d": 30}, 0)
+    engine.evaluate_fleet(0)
+    engine.remove_board("b", 1)
+    assert [event.state for event in engine.evaluate_fleet(1)] == ["cleared"]
+
+def test_missing_key_is_skipped():
+    engine = AlarmEngine()
+    engine.add_rule(ThresholdRule("temp", "t", high = 14))
+    assert engine.evaluate("a", {}, 0) == []
+
+def test_log_query_by_board_and_time():
+    log = EventLog()
+    for t, board in [(1, "a"), (2, "b"), (4, "a"), (3, "a"), (5, "b")]:
+        log.append(Event(t, board, "r", "raised", None))
+    assert [event.timestamp for event in log.query()] == [1, 2, 3, 4, 5]
+    assert [event.timestamp for event in log.query(board = "a")] == [1, 3, 4]
+    assert [event.timestamp for event in log.query(board = "a", start = 2, end = 3)] == [3]
+    assert [event.timestamp for event in log.query(start = 2, end = 4)] == [2, 3, 4]
+    assert log.query(board = "c") == []
+
+def test_log_trim_keeps_indexes_in_step():
+    log = EventLog(max_events = 3)
+    for t, board in [(1, "a"), (3, "b"), (2, "b"), (4, "a"), (5, "b")]:
+        log.append(Event(t, board, "r", "raised", None))
+    assert len(log) == 3
+    assert [event.timestamp for event in log.query()] == [3, 4, 5]
+    assert [event.timestamp for event in log.query(board = "a")] == [4]
+    assert [event.timestamp for event in log.query(board = "b", start = 3)] == [3, 5]
+
+def test_log_trim_forgets_empty_boards():
+    log = EventLog(max_events = 2)
+    for t, board in [(1, "a"), (2, "b"), (3, "b")]:
+        log.append(Event(t, board, "r", "raised", None))
+    assert log.boards() == ["b"]
+    assert log.query(board = "a") == []
@@ -7,6 +7,7 @@ import sys
 import glob
 import serial
 import time
+from alarms import AlarmEngine, ThresholdRule, ChangeRule
 
 class Heartbeat(QThread):
     pulse = pyqtSignal()
@@ -88,6 +89,30 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.btn_tx_save_regs.clicked.connect(self.tx_save_regs)
         self.ui.btn_rx_save_regs.clicked.connect(self.rx_save_regs)
 
+        # Alarm rules evaluated on every telemetry sample
+        self.board = None
+        self.alarms = AlarmEngine()
+        self.alarms.connect(self.alarm_event)
+        self.tx_deviation = self.alarms.add_rule(ThresholdRule("tx_deviation", "tx_diff",
+            high = self.ui.sb_tx_tolerance.value(), hysteresis = self.ui.sb_tx_tolerance.value() // 4,
+            absolute = True,
+            on_count = 3, off_count = 3))
+        self.rx_deviation = self.alarms.add_rule(ThresholdRule("rx_deviation", "rx_diff",
+            high = self.ui.sb_rx_tolerance.value(), hysteresis = self.ui.sb_rx_tolerance.value() // 4,
+            absolute = True,
+            on_count = 3, off_count = 3))
+        # Raw temperature bins above 14 read as "above +45 °C", see temp_range()
+        self.alarms.add_rule(ThresholdRule("tx_temp_high", "tx_temp", high = 14, hysteresis = 1,
+            on_count = 2, off_count = 2))
+        self.alarms.add_rule(ThresholdRule("rx_temp_high", "rx_temp", high = 14, hysteresis = 1,
+            on_count = 2, off_count = 2))
+        self.alarms.add_rule(ChangeRule("tx_enabled_changed", "tx_enabled"))
+        self.alarms.add_rule(ChangeRule("rx_enabled_changed", "rx_enabled"))
+        self.alarms.add_rule(ChangeRule("tx_vco_changed", "tx_vco"))
+        self.alarms.add_rule(ChangeRule("rx_vco_changed", "rx_vco"))
+        self.ui.sb_tx_tolerance.valueChanged.connect(self.tx_tolerance_changed)
+        self.ui.sb_rx_tolerance.valueChanged.connect(self.rx_tolerance_changed)
+
     def update_ui(self):
         # Firmware
         mwc_attrs = self.iio_ctx.find_device("mwc").attrs
@@ -150,8 +175,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Tx
         tx_attrs = self.iio_ctx.find_device("hmc6300").attrs
-        freq = tx_attrs.get("vco").value
-        freq = str(float(int(freq) / 1000000))
+        tx_vco = tx_attrs.get("vco").value
+        freq = str(float(int(tx_vco) / 1000000))
         self.ui.cb_tx_vco.blockSignals(True)
         self.ui.cb_tx_vco.setCurrentText(freq)
         self.ui.cb_tx_vco.blockSignals(False)
@@ -166,15 +191,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.cb_tx_rfvga.blockSignals(True)
         self.cb_tx_rfvga.setCurrentIndex(int(rfvga))
         self.cb_tx_rfvga.blockSignals(False)
-        temp = self.iio_ctx.find_device("hmc6300").find_channel("temp").attrs.get("raw").value
-        self.ui.lbl_tx_temp_dyn.setText(str(temp) + " " + self.temp_range(int(temp)))
+        tx_temp = self.iio_ctx.find_device("hmc6300").find_channel("temp").attrs.get("raw").value
+        self.ui.lbl_tx_temp_dyn.setText(str(tx_temp) + " " + self.temp_range(int(tx_temp)))
         gain = 32 - float(ifvga) * 1.3 - float(rfvga) * 1.3
         self.ui.lbl_tx_gain_dyn.setText("{:.1f} dB".format(gain))
 
         # Rx
         rx_attrs = self.iio_ctx.find_device("hmc6301").attrs
-        freq = rx_attrs.get("vco").value
-        freq = str(float(int(freq) / 1000000))
+        rx_vco = rx_attrs.get("vco").value
+        freq = str(float(int(rx_vco) / 1000000))
         self.ui.cb_rx_vco.blockSignals(True)
         self.ui.cb_rx_vco.setCurrentText(freq)
         self.ui.cb_rx_vco.blockSignals(False)
@@ -191,8 +216,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.cb_rx_rflna.blockSignals(True)
         self.cb_rx_rflna.setCurrentIndex(int(rflna))
         self.cb_rx_rflna.blockSignals(False)
-        temp = self.iio_ctx.find_device("hmc6301").find_channel("temp").attrs.get("raw").value
-        self.ui.lbl_rx_temp_dyn.setText(str(temp) + " " + self.temp_range(int(temp)))
+        rx_temp = self.iio_ctx.find_device("hmc6301").find_channel("temp").attrs.get("raw").value
+        self.ui.lbl_rx_temp_dyn.setText(str(rx_temp) + " " + self.temp_range(int(rx_temp)))
         bbcoarse1 = rx_attrs.get("bb_attn1").value
         self.ui.cb_rx_bbcoarse1.blockSignals(True)
         self.ui.cb_rx_bbcoarse1.setCurrentIndex(self.ui.cb_rx_bbcoarse1.findData(int(bbcoarse1)))
@@ -211,6 +236,43 @@ class MainWindow(QtWidgets.QMainWindow):
                 int(self.ui.cb_rx_bbfine.currentText().split()[0])
         self.ui.lbl_rx_gain_dyn.setText("{:.1f} dB".format(gain))
 
+        # Alarms
+        if self.board is not None:
+            self.alarms.evaluate(self.board, {
+                "tx_diff": tx_diff,
+                "rx_diff": rx_diff,
+                "tx_temp": int(tx_temp),
+                "rx_temp": int(rx_temp),
+                "tx_enabled": txen,
+                "rx_enabled": rxen,
+                "tx_vco": int(tx_vco),
+                "rx_vco": int(rx_vco),
+            })
+            self.alarms.evaluate_fleet()
+
+    def alarm_event(self, event):
+        if event.state == "raised":
+            self.ui.statusbar.showMessage("{0}: {1} ({2})".format(event.board, event.rule, event.value))
+            return
+        # Fall back to the most recently raised alarm still active on the board
+        if event.board == self.alarms.FLEET:
+            active = self.alarms.fleet_active()
+        else:
+            active = [rule for board, rule in self.alarms.active(event.board)]
+        for raised in reversed(self.alarms.log.query(board = event.board)):
+            if raised.state == "raised" and raised.rule in active:
+                self.ui.statusbar.showMessage("{0}: {1} ({2})".format(raised.board, raised.rule, raised.value))
+                return
+        self.ui.statusbar.clearMessage()
+
+    def tx_tolerance_changed(self, value):
+        self.tx_deviation.high = value
+        self.tx_deviation.hysteresis = value // 4
+
+    def rx_tolerance_changed(self, value):
+        self.rx_deviation.high = value
+        self.rx_deviation.hysteresis = value // 4
+
     def init_ui(self):
         # Tabs
         self.ui.transceiver_tab.setEnabled(False)
@@ -369,6 +431,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         value = int(value.split("x")[1], 16) if value.__contains__("0x") else int(value, 16)
         value &= 0xff
+        self.alarms.suppress(self.board)
         self.iio_ctx.find_device("hmc6300").reg_write(reg, value)
 
         self.ui.tb_tx_registers.blockSignals(True)
@@ -381,6 +444,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         value = int(value.split("x")[1], 16) if value.__contains__("0x") else int(value, 16)
         value &= 0xff
+        self.alarms.suppress(self.board)
         self.iio_ctx.find_device("hmc6301").reg_write(reg, value)
 
         self.ui.tb_rx_registers.blockSignals(True)
@@ -402,6 +466,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         try:
             self.iio_ctx = iio.Context("serial:" + text + ",115200,8n2n")
+            self.board = text
 
             # Context attributes
             ctx_attrs = self.iio_ctx.attrs
@@ -438,6 +503,8 @@ class MainWindow(QtWidgets.QMainWindow):
                 # Device not connected
                 # Used when disconnecting a device
                 self.iio_ctx = None
+                self.alarms.remove_board(text)
+                self.board = None
                 self.ui.cb_available_contexts.removeItem(index)
                 self.ui.cb_available_contexts.setCurrentIndex(0)
                 self.init_ui()
@@ -470,9 +537,11 @@ class MainWindow(QtWidgets.QMainWindow):
             return "(above +45 °C)"
 
     def tx_power_switch(self, value):
+        self.alarms.expect(self.board, "tx_enabled", value == True)
         self.iio_ctx.find_device("hmc6300").attrs.get("enabled").value = "1" if value == True else "0"
 
     def rx_power_switch(self, value):
+        self.alarms.expect(self.board, "rx_enabled", value == True)
         self.iio_ctx.find_device("hmc6301").attrs.get("enabled").value = "1" if value == True else "0"
 
     def tx_autotuning_switch(self):
@@ -541,6 +610,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         reply = q.exec()
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+            self.alarms.suppress(self.board)
             self.iio_ctx.find_device("mwc").attrs.get("reset").value = '1'
         else:
             return
@@ -551,11 +621,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def tx_vco_changed(self):
         text = self.ui.cb_tx_vco.currentText()
         freq = str(int(float(text) * 1000000))
+        self.alarms.expect(self.board, "tx_vco", int(freq))
         self.iio_ctx.find_device("hmc6300").attrs.get("vco").value = freq
 
     def rx_vco_changed(self):
         text = self.ui.cb_rx_vco.currentText()
         freq = str(int(float(text) * 1000000))
+        self.alarms.expect(self.board, "rx_vco", int(freq))
         self.iio_ctx.find_device("hmc6301").attrs.get("vco").value = freq
 
     def tx_ifvga_changed(self, index):
@@ -598,6 +670,7 @@ class MainWindow(QtWidgets.QMainWindow):
         fileName, type = QtWidgets.QFileDialog.getOpenFileName(self, "Open TX registers file", "Text files (*.txt)")
         if fileName == "":
             return
+        self.alarms.suppress(self.board)
         with open(fileName, 'r') as infile:
             infile.readline()
             for i in range(28):
@@ -614,6 +687,7 @@ class MainWindow(QtWidgets.QMainWindow):
         fileName, type = QtWidgets.QFileDialog.getOpenFileName(self, "Open RX registers file", "Text files (*.txt)")
         if fileName == "":
             return
+        self.alarms.suppress(self.board)
         with open(fileName, 'r') as infile:
             infile.readline()
             for i in range(28):